@@ -1,11 +1,84 @@
-from bs4 import BeautifulSoup
+import aiohttp
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import csv
+import json
+import os
 import re
 import requests
 import sys
 from typing import Dict, Optional, List, Tuple
 from urllib.parse import urljoin, urlparse
-import xml.etree.ElementTree as ET
+from lxml import etree as ET
+from selectolax.lexbor import LexborHTMLParser
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# Maximum number of detail pages fetched concurrently.
+MAX_CONCURRENT_REQUESTS = 20
+
+# How long cached responses stay valid, so reruns while iterating on the
+# parsing code read from disk instead of the network
+CACHE_NAME = 'wwd_cache'
+# aiohttp-client-cache and requests-cache both append .sqlite to a bare
+# cache name but use incompatible schemas, so the async cache needs its
+# own file
+ASYNC_CACHE_NAME = f'{CACHE_NAME}_async'
+CACHE_EXPIRY = 7 * 86400
+
+# Sidecar recording the ETag/Last-Modified of each scraped detail page
+# plus its parsed row, so unchanged pages come back as 304 Not Modified
+# with no body to transfer or parse
+MANIFEST_NAME = 'wwd_manifest.json'
+
+# Shared session so repeated requests to the WWD host reuse pooled
+# connections instead of redoing DNS/TCP/TLS each time. When
+# requests-cache is installed, responses are also cached on disk.
+try:
+    import requests_cache
+    SESSION = requests_cache.CachedSession(CACHE_NAME, expire_after=CACHE_EXPIRY)
+except ImportError:
+    SESSION = requests.Session()
+SESSION.headers.update({'User-Agent': USER_AGENT})
+_adapter = requests.adapters.HTTPAdapter(pool_connections=32, pool_maxsize=64)
+SESSION.mount('http://', _adapter)
+SESSION.mount('https://', _adapter)
+
+# Async analogue of requests-cache for the detail-page fetches
+try:
+    from aiohttp_client_cache import CachedSession as AiohttpCachedSession, SQLiteBackend
+except ImportError:
+    AiohttpCachedSession = None
+
+# Parquet output for downstream consumers; reading it back is far
+# cheaper than re-parsing the CSV
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Patterns used inside the per-placemark loops, compiled once at import
+_COORDS_RE = re.compile(r'([-+]?\d+\.?\d*),\s*([-+]?\d+\.?\d*)')
+_LOC_RE = re.compile(r'([^,\n]+County),\s*([^,\n]+),\s*([^,\n]+)')
+_WWD_ID_RE = re.compile(r'[/-](\d+)$')
+
+# XPath expressions evaluated against every Placemark, compiled once at
+# import. Matching on local-name() keeps them valid for KMLs with or
+# without a namespace, replacing the old find-with-fallback pairs.
+_NAME_XP = ET.XPath('*[local-name()="name"]/text()')
+_HREF_XP = ET.XPath('*[local-name()="description"]//*[local-name()="a"]/@href')
+_COORD_XP = ET.XPath('*[local-name()="Point"]/*[local-name()="coordinates"]/text()')
+
+def load_manifest() -> Dict[str, Dict[str, any]]:
+    if os.path.isfile(MANIFEST_NAME):
+        with open(MANIFEST_NAME, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+def save_manifest(manifest: Dict[str, Dict[str, any]]) -> None:
+    with open(MANIFEST_NAME, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
 
 def download_and_parse_kml(kml_url: str) -> List[Dict[str, any]]:
     """
@@ -26,32 +99,27 @@ def download_and_parse_kml(kml_url: str) -> List[Dict[str, any]]:
     
     try:
         # Download the KML file
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
-        response = requests.get(kml_url, headers=headers)
+        response = SESSION.get(kml_url)
         response.raise_for_status()
         
         # Parse the XML content
         root = ET.fromstring(response.content)
-        
-        # Define KML namespace (KML files typically use this namespace)
-        kml_namespace = {'kml': 'http://www.opengis.net/kml/2.2'}
-        
-        # Try to find namespace in the root element if not standard
-        if root.tag.startswith('{'):
-            # Extract namespace from root tag
-            namespace_match = re.match(r'\{([^}]+)\}', root.tag)
-            if namespace_match:
-                namespace_uri = namespace_match.group(1)
-                kml_namespace = {'kml': namespace_uri}
-        
-        # Find all Placemark elements - try with and without namespace
-        placemarks = root.findall('.//kml:Placemark', kml_namespace)
-        if not placemarks:
+
+        # lxml exposes the root element's namespace directly (whether
+        # declared with a prefix or as the default), so no regexing of
+        # root.tag is needed and a single findall replaces the old
+        # try-both-forms tree walks
+        namespace_uri = ET.QName(root).namespace
+        if namespace_uri:
+            placemarks = root.findall('.//kml:Placemark', {'kml': namespace_uri})
+        else:
             placemarks = root.findall('.//Placemark')
-        
+
+        # Base URL for resolving relative hrefs, computed once per KML
+        _parsed = urlparse(kml_url)
+        base_url = f"{_parsed.scheme}://{_parsed.netloc}"
+
+
         for placemark in placemarks:
             result = {
                 'name': None,
@@ -60,28 +128,15 @@ def download_and_parse_kml(kml_url: str) -> List[Dict[str, any]]:
                 'longitude': None
             }
             
-            # Extract name - try with and without namespace
-            name_value = None
-            name_element = placemark.find('kml:name', kml_namespace)
-            if name_element is None:
-                name_element = placemark.find('name')
-            if name_element is not None:
-                name_value = name_element.text
-            if name_value:
-                result['name'] = name_value.strip()
-            
+            # Extract name
+            name_values = _NAME_XP(placemark)
+            if name_values and name_values[0].strip():
+                result['name'] = name_values[0].strip()
+
             # Look for href in description or other elements
             # The href might be in the description as HTML content
-            description_element = placemark.find('kml:description', kml_namespace)
-            if description_element is None:
-                description_element = placemark.find('description')
-            
-            href_value = None
-            if description_element is not None:
-                links = description_element.findall('./*/{*}a')
-                for link in links:
-                    href_value = link.get('href')
-                    break
+            hrefs = _HREF_XP(placemark)
+            href_value = hrefs[0] if hrefs else None
 
             # Clean up the extracted value
             if href_value:
@@ -89,16 +144,13 @@ def download_and_parse_kml(kml_url: str) -> List[Dict[str, any]]:
                 
                 # If href is relative, make it absolute
                 if href_value.startswith('/') or not href_value.startswith('http'):
-                    base_url = f"{urlparse(kml_url).scheme}://{urlparse(kml_url).netloc}"
                     href_value = urljoin(base_url, href_value)
                 
                 result['href'] = href_value
 
             # Look for coordinates in the format "lng, lat"
-            coords_pattern = r'([-+]?\d+\.?\d*),\s*([-+]?\d+\.?\d*)'
-            coordinates = placemark.findall('./{*}Point/{*}coordinates')
-            for coords in coordinates:
-                coords_match = re.search(coords_pattern, coords.text)        
+            for coords in _COORD_XP(placemark):
+                coords_match = _COORDS_RE.search(coords)
                 if coords_match:
                     result['latitude'] = float(coords_match.group(2).strip())
                     result['longitude'] = float(coords_match.group(1).strip())
@@ -110,34 +162,80 @@ def download_and_parse_kml(kml_url: str) -> List[Dict[str, any]]:
     
     except requests.RequestException as e:
         print(f"Error downloading KML file: {e}")
-    except ET.ParseError as e:
+    except ET.XMLSyntaxError as e:
         print(f"Error parsing KML XML: {e}")
     except Exception as e:
         print(f"Unexpected error: {e}")
     
     return results
 
-def get_waterfall_data(aside: ET.Element) -> Dict[str, str]:
+def get_waterfall_data(aside) -> Dict[str, str]:
     data = {}
-    trs = aside.find_all('tr')
-    for tr in trs:
-        tds = tr.find_all('td')
+    for tr in aside.css('tr'):
+        tds = tr.css('td')
         if len(tds) == 2:
-            key = tds[0].text.strip()
+            key = tds[0].text(strip=True)
             if key:
-                value = tds[1].text.strip()
+                value = tds[1].text(strip=True)
                 data[key] = value
     return data
 
-def scrape_waterfall_info(name: str, url: str, id_prefix: str, data: Dict[str, any]) -> Dict[str, any]:
+def parse_waterfall_page(body: bytes, result: Dict[str, any]) -> Dict[str, any]:
+    """
+    Parse a World Waterfall Database detail page, filling in the given
+    result Dict. CPU-bound, so callers on the event loop should run this
+    in an executor.
+    """
+    tree = LexborHTMLParser(body)
+
+    # Extract location information from the page title/header
+    # Look for the location text that appears near the waterfall name
+    # Try to find location in the main content area
+    main_content = tree.css_first('div.content') or tree.css_first('main') or tree.body
+    if main_content is not None:
+        # Look for text patterns that match "County, State, Country"
+        text_content = main_content.text()
+
+        # Pattern to match location format: "County, State, Country"
+        location_match = _LOC_RE.search(text_content)
+
+        if location_match:
+            result['county'] = location_match.group(1).strip()
+            result['state'] = location_match.group(2).strip()
+            result['country'] = location_match.group(3).strip()
+
+    sidebar = tree.css_first('aside.waterfall-info-sidebar')
+    if sidebar is not None:
+        waterfall_data = get_waterfall_data(sidebar)
+
+        # Extract coordinates
+        coordinates = waterfall_data.get('Location')
+        if coordinates:
+            # Look for coordinates in the format "lat, lng"
+            coords_match = _COORDS_RE.search(coordinates)
+
+            if coords_match:
+                result['latitude'] = float(coords_match.group(1).strip())
+                result['longitude'] = float(coords_match.group(2).strip())
+
+        result['form'] = waterfall_data.get('Form')
+        result['watershed'] = waterfall_data.get('Watershed')
+        result['stream'] = waterfall_data.get('Stream')
+
+    return result
+
+async def scrape_waterfall_info_async(session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, manifest: Dict[str, Dict[str, any]], name: str, url: str, id_prefix: str, data: Dict[str, any]) -> Dict[str, any]:
     """
     Scrape waterfall information from a World Waterfall Database detail page.
-    
+
     Args:
+        session (aiohttp.ClientSession): Shared session for connection reuse
+        semaphore (asyncio.Semaphore): Bounds the number of in-flight fetches
+        manifest (Dict): ETag/Last-Modified validators per waterfall id
         name (str): The name of the waterfall
         url (str): The URL of the waterfall detail page
         data (Dict): Optional 'latitude', and 'longitude' defaults
-        
+
     Returns:
         Dict containing the following keys:
         - id: Unique ID, like "CA-4940"
@@ -168,73 +266,46 @@ def scrape_waterfall_info(name: str, url: str, id_prefix: str, data: Dict[str, a
         'stream': None
     }
 
-    wwd_id_match = re.search(r'[/-](\d+)$', url)
+    wwd_id_match = _WWD_ID_RE.search(url)
     if wwd_id_match:
         wwd_id = wwd_id_match.group(1)
         result['id'] = f"{id_prefix}-{wwd_id}"
     else:
         raise RuntimeError(f"No id number parsed from {url}")
 
+    # Ask the server to skip the body if our stored validators still match
+    entry = manifest.get(result['id'], {})
+    conditional_headers = {}
+    if entry.get('etag'):
+        conditional_headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        conditional_headers['If-Modified-Since'] = entry['last_modified']
+
     try:
-        # Fetch the webpage
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        
-        # Parse HTML
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Extract location information from the page title/header
-        # Look for the location text that appears near the waterfall name
-        location_text = None
-        
-        # Try to find location in the main content area
-        main_content = soup.find('div', class_='content') or soup.find('main') or soup.body
-        if main_content:
-            # Look for text patterns that match "County, State, Country"
-            text_content = main_content.get_text()
-            
-            # Pattern to match location format: "County, State, Country"
-            location_pattern = r'([^,\n]+County),\s*([^,\n]+),\s*([^,\n]+)'
-            location_match = re.search(location_pattern, text_content)
-            
-            if location_match:
-                result['county'] = location_match.group(1).strip()
-                result['state'] = location_match.group(2).strip()
-                result['country'] = location_match.group(3).strip()
-        
-        sidebar = soup.find('aside', class_='waterfall-info-sidebar')
-        if sidebar:
-            waterfall_data = get_waterfall_data(sidebar)
-
-            # Extract coordinates
-            coordinates = waterfall_data.get('Location')
-            if coordinates:
-                # Look for coordinates in the format "lat, lng"
-                coords_pattern = r'([-+]?\d+\.?\d*),\s*([-+]?\d+\.?\d*)'
-                coords_match = re.search(coords_pattern, coordinates)
-        
-                if coords_match:
-                    result['latitude'] = float(coords_match.group(1).strip())
-                    result['longitude'] = float(coords_match.group(2).strip())
-        
-            result['form'] = waterfall_data.get('Form')
-            result['watershed'] = waterfall_data.get('Watershed')
-            result['stream'] = waterfall_data.get('Stream')
-        
+        # Fetch the webpage, with the semaphore bounding concurrency
+        async with semaphore:
+            async with session.get(url, headers=conditional_headers) as response:
+                if response.status == 304 and entry.get('row'):
+                    return entry['row']
+                response.raise_for_status()
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+                body = await response.read()
+
+        # Parse HTML in an executor so the next fetch overlaps with parsing
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, parse_waterfall_page, body, result)
+        manifest[result['id']] = {'etag': etag, 'last_modified': last_modified, 'row': result}
         return result
-        
-    except requests.RequestException as e:
+
+    except aiohttp.ClientError as e:
         print(f"Error fetching URL: {e}")
         return result
     except Exception as e:
         print(f"Error parsing waterfall data: {e}")
         return result
 
-# Example usage
-if __name__ == "__main__":
+async def main() -> None:
     urls = [
         ('CA', 'https://www.worldwaterfalldatabase.com/api/United-States/California/getKML'),
         ('OR', 'https://www.worldwaterfalldatabase.com/api/United-States/Oregon/getKML'),
@@ -255,30 +326,63 @@ if __name__ == "__main__":
         'wwd_url'
     ]
 
-    with open('waterfalls.csv', 'w', newline='', encoding='utf-8') as f:
+    # One shared session so connections to the WWD host are reused
+    connector = aiohttp.TCPConnector(limit_per_host=MAX_CONCURRENT_REQUESTS, keepalive_timeout=60)
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    manifest = load_manifest()
+    all_rows = []
+
+    if AiohttpCachedSession is not None:
+        session = AiohttpCachedSession(cache=SQLiteBackend(ASYNC_CACHE_NAME, expire_after=CACHE_EXPIRY), connector=connector, headers={'User-Agent': USER_AGENT})
+    else:
+        session = aiohttp.ClientSession(connector=connector, headers={'User-Agent': USER_AGENT})
+
+    with open('waterfalls.csv', 'w', newline='', encoding='utf-8', buffering=1 << 20) as f:
         dict_writer = csv.DictWriter(f, fieldnames=fields)
         dict_writer.writeheader()
 
-        for id_prefix, kml_url in urls:
-            print(f"Attempting to parse {kml_url}...")
-            print("=" * 50)
-            
-            # Try the main function first
-            placemark_data = download_and_parse_kml(kml_url)
-            
-            if placemark_data:
-                print(f"Found {len(placemark_data)} waterfalls:")
-                for data in placemark_data:
-                    waterfall_data = scrape_waterfall_info(data['name'], data['href'], id_prefix, data)
-                    
-                    print()
-                    print("Waterfall Information:")
-                    print("=" * 30)
-                    for key, value in waterfall_data.items():
-                        print(f"{key}: {value}")
-
-                    dict_writer.writerow(waterfall_data)
-            else:
-                print(f"{kml_url}: No waterfall data found.")
-    
+        async with session:
+            # The state KMLs are independent blocking GETs, so download
+            # and parse them all at once in a small thread pool
+            loop = asyncio.get_running_loop()
+            with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+                kml_results = await asyncio.gather(*(
+                    loop.run_in_executor(executor, download_and_parse_kml, kml_url)
+                    for _, kml_url in urls
+                ))
+
+            for (id_prefix, kml_url), placemark_data in zip(urls, kml_results):
+                print(f"Attempting to parse {kml_url}...")
+                print("=" * 50)
+
+                if placemark_data:
+                    print(f"Found {len(placemark_data)} waterfalls:")
+                    tasks = [
+                        scrape_waterfall_info_async(session, semaphore, manifest, data['name'], data['href'], id_prefix, data)
+                        for data in placemark_data
+                    ]
+                    rows = await asyncio.gather(*tasks)
+                    for waterfall_data in rows:
+                        print()
+                        print("Waterfall Information:")
+                        print("=" * 30)
+                        for key, value in waterfall_data.items():
+                            print(f"{key}: {value}")
+
+                    # One bulk write per state keeps disk I/O off the
+                    # scraping critical path
+                    dict_writer.writerows(rows)
+                    all_rows.extend(rows)
+                else:
+                    print(f"{kml_url}: No waterfall data found.")
+
+    save_manifest(manifest)
+
+    # Columnar copy of the CSV for fast downstream reads
+    if pa is not None and all_rows:
+        pq.write_table(pa.Table.from_pylist(all_rows), 'waterfalls.parquet')
+
+# Example usage
+if __name__ == "__main__":
+    asyncio.run(main())
 
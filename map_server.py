@@ -1,18 +1,49 @@
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import mimetypes
+import os
+import shutil
 
 class MapServer(BaseHTTPRequestHandler):
     def do_GET(self):
         if self.path == '/':
             self.path = '/waterfalls.html'
+        file_path = self.path[1:]
         try:
-            file_to_open = open(self.path[1:]).read()
-            self.send_response(200)
-        except:
-            print(f"File {self.path[1:]} not found")
-            file_to_open = "File not found"
+            f = open(file_path, 'rb')
+        except OSError:
+            print(f"File {file_path} not found")
+            body = b'File not found'
             self.send_response(404)
-        self.end_headers()
-        self.wfile.write(bytes(file_to_open, 'utf-8'))
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            content_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(size))
+            self.end_headers()
+
+            # Flush the buffered headers, then let the kernel copy the
+            # file straight to the socket without passing the bytes
+            # through the interpreter. os.sendfile does not exist on
+            # Windows, so stream the file there instead.
+            self.wfile.flush()
+            if hasattr(os, 'sendfile'):
+                sent = 0
+                try:
+                    while sent < size:
+                        sent += os.sendfile(self.wfile.fileno(), f.fileno(), sent, size - sent)
+                except OSError:
+                    # Sockets that refuse sendfile stream the rest instead
+                    f.seek(sent)
+                    shutil.copyfileobj(f, self.wfile)
+            else:
+                shutil.copyfileobj(f, self.wfile)
 
-httpd = HTTPServer(('localhost', 8080), MapServer)
+httpd = ThreadingHTTPServer(('localhost', 8080), MapServer)
 httpd.serve_forever()
@@ -4,12 +4,20 @@ import typing
 import requests
 import json
 import io
+import mmap
 import pathlib
 import os
 import sys
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image as PIL_Image  # type: ignore
-from PIL import ImageDraw as PIL_ImageDraw  # type: ignore
+
+# orjson's C parser is several times faster than the stdlib on a large
+# marker file; fall back to json if it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 GITHUB_URL = 'https://github.com/flopp/py-staticmaps'
 LIB_NAME = 'py-staticmaps'
@@ -63,28 +71,34 @@ def stadia_marker(marker: LabeledMarker) -> str:
     return f"&m={lat},{lng},{style},{color},{label}"
 
 def add_markers(context: staticmaps.Context, json_file):
-    with open(json_file, 'r') as f:
-        markers = json.load(f)
+    if orjson is not None:
+        with open(json_file, 'rb') as f:
+            markers = orjson.loads(f.read())
+    else:
+        with open(json_file, 'r') as f:
+            markers = json.load(f)
     for marker in markers:
         latlng = staticmaps.create_latlng(marker['lat_lng'][0], marker['lat_lng'][1])
         obj = LabeledMarker(latlng, color=LIGHT_ORANGE, size=MARKER_SIZE_OSM, label=marker['name'])
         context.add_object(obj)
 
-def fetch_stadia(context: staticmaps.Context, api_key: str, cache_dir: str, center: s2sphere.LatLng, zoom: int, width: int, height: int) -> typing.Optional[bytes]:
+def fetch_stadia(context: staticmaps.Context, api_key: str, cache_dir: str, center: s2sphere.LatLng, zoom: int, width: int, height: int) -> typing.Union[bytes, mmap.mmap, None]:
     user_agent = f"Mozilla/5.0+(compatible; {LIB_NAME}/{VERSION}; {GITHUB_URL})"
 
     file_name = None
     if cache_dir is not None:
         file_name = os.path.join(cache_dir, 'stadia-terrain', str(zoom), '1', '1.png')
         if os.path.isfile(file_name):
+            # Map the cached PNG instead of copying it into a bytes
+            # object; the mapping stays valid after the file is closed
             with open(file_name, 'rb') as f:
-                return f.read()
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
 
     c = latlng_to_string(center)
     url = f"https://tiles.stadiamaps.com/static/stamen_terrain.png?api_key={api_key}&size={width}x{height}&center={c}&zoom={zoom}"
 
     if context._objects is not None:
-        url = url + ''.join([stadia_marker(marker) for marker in context._objects if isinstance(marker, LabeledMarker)])
+        url = url + ''.join(stadia_marker(marker) for marker in context._objects if isinstance(marker, LabeledMarker))
 
     res = requests.get(url, headers={'user-agent': user_agent})
     if res.status_code == 200:
@@ -121,24 +135,47 @@ def render_stadia(context: staticmaps.Context, api_key: str, width: int, height:
     center = context._bounds.get_center()
     zoom = ZOOM_STADIA
 
-    image = PIL_Image.new('RGBA', (width, height))
-    draw = PIL_ImageDraw.Draw(image)
-
     image_data = fetch_stadia(context, api_key, context._cache_dir, center, zoom, width, height)
     if image_data is None:
-        return image
+        return PIL_Image.new('RGBA', (width, height))
+
+    # An mmap is already a seekable file-like object, so only plain bytes
+    # need the BytesIO wrapper
+    if isinstance(image_data, mmap.mmap):
+        tile_img = PIL_Image.open(image_data)
+    else:
+        tile_img = PIL_Image.open(io.BytesIO(image_data))
+
+    # The tile normally covers the whole map, so a blank RGBA canvas
+    # plus a full-surface paste would just be an extra allocation and blit
+    if tile_img.size == (width, height):
+        return tile_img.convert('RGBA')
 
-    tile_img = PIL_Image.open(io.BytesIO(image_data))
+    image = PIL_Image.new('RGBA', (width, height))
     image.paste(tile_img)
 
     return image
 
+def read_api_key(path: str = 'api_key.txt') -> str:
+    with open(path, 'r') as f:
+        return f.readline().strip()
+
 def create_static_map(provider: str) -> None:
     context = staticmaps.Context()
-    add_markers(context, "C:\\Users\\Rachel\\Documents\\GitHub\\geolocator\\map_data.json")
+
+    # The Stadia tile URL embeds every marker, so the tile fetch cannot
+    # start before the markers are loaded. Overlap the independent work
+    # instead: decode the marker JSON while reading the API key.
+    api_key_future = None
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        markers_future = executor.submit(add_markers, context, "C:\\Users\\Rachel\\Documents\\GitHub\\geolocator\\map_data.json")
+        if provider == 'stadia':
+            api_key_future = executor.submit(read_api_key)
+        markers_future.result()
+
     bounds = staticmaps.parse_latlngs2rect(BOUNDS)
     context.add_bounds(bounds)
-    
+
     match provider:
         case 'osm':
             context.set_cache_dir("C:\\Users\\Rachel\\Documents\\GitHub\\geolocator\\cache")
@@ -162,8 +199,7 @@ def create_static_map(provider: str) -> None:
                 svg_image.write(f, pretty=True)
 
         case 'stadia':
-            with open('api_key.txt', 'r') as f:
-                api_key = f.readline().strip()
+            api_key = api_key_future.result()
 
             context.set_cache_dir(None)
             # context.set_cache_dir("C:\\Users\\Rachel\\Documents\\GitHub\\geolocator\\cache")